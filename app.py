@@ -1,6 +1,7 @@
-from flask import Flask, render_template, request, jsonify
-from src.config import setup_logging
-from src.device_manager import list_devices, connect_device, cleanup_existing_connections
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from src.config import setup_logging, DEFAULT_ONBOARD_CONCURRENCY, ONBOARD_MAX_RETRIES
+from src.device_manager import list_devices, connect_device, cleanup_existing_connections, is_valid_device_id
+from src.fleet_manager import resolve_device_ids, validate_onboard_options, stream_onboarding, teardown_devices
 from src.location_service import set_location, clear_location
 from src.process_utils import run_pymobiledevice3_command
 
@@ -30,11 +31,51 @@ def api_connect_device():
     result = connect_device(device_id)
     return jsonify(result)
 
+@app.route('/api/fleet/onboard', methods=['POST'])
+def api_onboard_fleet():
+    """API endpoint to prepare several devices in parallel, streaming progress as NDJSON"""
+    data = request.get_json(silent=True) if request.is_json else {}
+    if not isinstance(data, dict):
+        data = {}
+    
+    is_valid, options = validate_onboard_options(
+        data.get('concurrency', DEFAULT_ONBOARD_CONCURRENCY),
+        data.get('retries', ONBOARD_MAX_RETRIES)
+    )
+    if not is_valid:
+        return jsonify({
+            'success': False,
+            'message': options
+        })
+    concurrency, max_retries = options
+    
+    is_valid, device_ids = resolve_device_ids(data.get('deviceIds'))
+    if not is_valid:
+        return jsonify({
+            'success': False,
+            'message': device_ids
+        })
+    
+    return Response(
+        stream_with_context(stream_onboarding(device_ids, concurrency, max_retries)),
+        mimetype='application/x-ndjson'
+    )
+
 @app.route('/api/disconnect', methods=['POST'])
 def api_disconnect_device():
-    """API endpoint to disconnect current device and clean up connections"""
+    """API endpoint to disconnect current device and clean up connections
+    
+    Optional deviceIds (list of UDIDs or "all") also stops fleet-onboarded tunnels.
+    """
+    data = request.get_json(silent=True) if request.is_json else {}
+    device_ids = data.get('deviceIds', None) if isinstance(data, dict) else None
+    
     cleanup_existing_connections()
     
+    if device_ids is not None:
+        result = teardown_devices(device_ids)
+        return jsonify(result)
+    
     return jsonify({
         'success': True,
         'message': 'Device disconnected and connections cleaned up'
@@ -46,6 +87,7 @@ def api_set_location():
     data = request.get_json()
     lat = data.get('latitude')
     lng = data.get('longitude')
+    device_id = data.get('deviceId', None)
     
     if not lat or not lng:
         return jsonify({
@@ -53,13 +95,28 @@ def api_set_location():
             'message': 'Latitude and longitude are required'
         })
     
-    result = set_location(lat, lng)
+    if device_id is not None and not is_valid_device_id(device_id):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid device ID'
+        })
+    
+    result = set_location(lat, lng, device_id)
     return jsonify(result)
 
 @app.route('/api/location/clear', methods=['POST'])
 def api_clear_location():
     """API endpoint to clear simulated location"""
-    result = clear_location()
+    data = request.get_json(silent=True) if request.is_json else {}
+    device_id = data.get('deviceId', None) if isinstance(data, dict) else None
+    
+    if device_id is not None and not is_valid_device_id(device_id):
+        return jsonify({
+            'success': False,
+            'message': 'Invalid device ID'
+        })
+    
+    result = clear_location(device_id)
     return jsonify(result)
 
 @app.route('/api/status', methods=['GET'])
@@ -0,0 +1,59 @@
+import argparse
+import sys
+from src.config import DEFAULT_ONBOARD_CONCURRENCY, MAX_ONBOARD_CONCURRENCY, ONBOARD_MAX_RETRIES
+from src.fleet_manager import resolve_device_ids, validate_onboard_options, onboard_devices, teardown_devices
+
+def print_event(event):
+    """Print a single onboarding progress event"""
+    if event['type'] == 'step':
+        line = f"[{event['device_id']}] {event['step']}: {event['status']}"
+        if event['attempt'] > 1:
+            line += f" (attempt {event['attempt']})"
+        if 'duration' in event:
+            line += f" in {event['duration']}s"
+        if event.get('message'):
+            line += f" - {event['message']}"
+        print(line, flush=True)
+    elif event['type'] == 'device' and event['status'] != 'started':
+        print(f"[{event['device_id']}] {event['status'].upper()} in {event['duration']}s - {event['message']}", flush=True)
+
+def main():
+    """Command line entry point for bulk device onboarding"""
+    parser = argparse.ArgumentParser(description='Prepare several iOS devices for location testing in parallel')
+    parser.add_argument('udids', nargs='*', help='UDIDs of the devices to onboard')
+    parser.add_argument('--all', action='store_true', help='onboard every attached device')
+    parser.add_argument('--teardown', action='store_true', help='stop the tunnels of the given devices (or --all) instead of onboarding')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_ONBOARD_CONCURRENCY, help=f'max devices prepared at once, up to {MAX_ONBOARD_CONCURRENCY} (default: {DEFAULT_ONBOARD_CONCURRENCY})')
+    parser.add_argument('--retries', type=int, default=ONBOARD_MAX_RETRIES, help=f'retries per step for transient failures (default: {ONBOARD_MAX_RETRIES})')
+    args = parser.parse_args()
+
+    if args.all == bool(args.udids):
+        parser.error('pass either device UDIDs or --all')
+
+    if args.teardown:
+        result = teardown_devices('all' if args.all else args.udids)
+        print(result['message'], file=sys.stdout if result['success'] else sys.stderr)
+        return 0 if result['success'] else 1
+
+    is_valid, options = validate_onboard_options(args.concurrency, args.retries)
+    if not is_valid:
+        parser.error(options)
+
+    is_valid, device_ids = resolve_device_ids('all' if args.all else args.udids)
+    if not is_valid:
+        print(device_ids, file=sys.stderr)
+        return 1
+
+    summary = onboard_devices(device_ids, args.concurrency, args.retries, on_event=print_event)
+
+    print()
+    print(summary['message'])
+    print(f"Total time: {summary['duration']}s (slowest device: {summary['slowest_device']}s, one at a time: ~{summary['sequential_estimate']}s)")
+    for result in summary['results']:
+        if not result['success']:
+            print(f"  FAILED {result['device_id']} at {result['failed_step']}: {result['message']}")
+
+    return 0 if summary['success'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@ This package contains all the core business logic for the iOS location simulator
 - process_utils: Subprocess handling for pymobiledevice3 commands
 - device_manager: iOS device connection and setup management
 - location_service: Location setting and clearing functionality
+- fleet_manager: Parallel bulk onboarding of several devices
 """
 
 __version__ = "1.0.0" 
\ No newline at end of file
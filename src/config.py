@@ -10,4 +10,11 @@ def setup_logging():
 DEFAULT_TUNNEL_TIMEOUT = 10
 PROCESS_KILL_TIMEOUT = 1
 MONITOR_TIMEOUT = 15
-PROCESS_POLL_INTERVAL = 0.1 
\ No newline at end of file
+PROCESS_POLL_INTERVAL = 0.1 
+
+# Fleet onboarding defaults
+DEFAULT_ONBOARD_CONCURRENCY = 4
+MAX_ONBOARD_CONCURRENCY = 8
+ONBOARD_MAX_RETRIES = 2
+ONBOARD_RETRY_DELAY = 2
+TUNNEL_POLL_INTERVAL = 1
@@ -1,17 +1,50 @@
 import json
+import re
 import time
 from src.process_utils import run_pymobiledevice3_command
 from src.config import setup_logging
 
 logger = setup_logging()
 
-def cleanup_existing_connections():
-    """Clean up any existing tunnel connections and processes"""
+# Classic 40-char hex UDIDs and newer 8-16 hex UDIDs (e.g. 00008030-001A2D8E3A08802E)
+UDID_PATTERN = re.compile(r'^[0-9A-Fa-f]{40}$|^[0-9A-Fa-f]{8}-[0-9A-Fa-f]{16}$')
+
+def get_active_device_id():
+    """Return the device ID of the single-device connection, if any"""
+    tunnel_info = run_pymobiledevice3_command('cat /tmp/tunnel_info.txt')
+    parts = tunnel_info['output'].strip().split() if tunnel_info['success'] else []
+    if len(parts) >= 3 and is_valid_device_id(parts[2]):
+        return parts[2]
+    return None
+
+def stop_device_tunnel(device_id):
+    """Kill the tunnel process started for one device"""
+    logger.debug(f"Killing tunnel process for device {device_id}...")
+    # [s] keeps the pattern from matching the shell running pkill itself
+    run_pymobiledevice3_command(f'pkill -f "lockdown [s]tart-tunnel --udid {device_id}" || true')
+
+def is_device_tunnel_running(device_id):
+    """Check whether a tunnel process is running for one device"""
+    result = run_pymobiledevice3_command(f'pgrep -f "lockdown [s]tart-tunnel --udid {device_id}"')
+    return result['success'] and bool(result['output'].strip())
+
+def cleanup_existing_connections(device_id=None):
+    """Clean up the single-device tunnel connection and processes
+    
+    Only the active device (and device_id, if given) is touched, so tunnels
+    started by fleet onboarding for other devices keep running.
+    """
     logger.info("Cleaning up existing connections...")
     
-    # Kill any existing tunnel processes
+    # Kill existing tunnel processes
     logger.debug("Killing existing tunnel processes...")
-    run_pymobiledevice3_command('pkill -f "lockdown start-tunnel" || true')
+    active_device_id = get_active_device_id()
+    if is_valid_device_id(active_device_id):
+        stop_device_tunnel(active_device_id)
+    
+    # A fleet-onboarded device being connected loses its fleet tunnel, so drop its files too
+    if is_valid_device_id(device_id):
+        cleanup_device_connections(device_id)
     
     # Clean up tunnel files
     logger.debug("Cleaning up tunnel files...")
@@ -21,11 +54,52 @@ def cleanup_existing_connections():
     time.sleep(1)
     logger.info("Cleanup completed")
 
+def cleanup_device_connections(device_id):
+    """Clean up the tunnel process and files of one fleet-onboarded device"""
+    logger.info(f"Cleaning up existing connections for device {device_id}...")
+    stop_device_tunnel(device_id)
+    run_pymobiledevice3_command(f'rm -f {device_tunnel_log_file(device_id)} {device_tunnel_info_file(device_id)}')
+
+def cleanup_all_device_connections():
+    """Clean up the tunnel processes and files of every fleet-onboarded device"""
+    logger.info("Cleaning up connections for all devices...")
+    run_pymobiledevice3_command('pkill -f "lockdown [s]tart-tunnel --udid" || true')
+    run_pymobiledevice3_command('rm -f /tmp/tunnel_*.log /tmp/tunnel_info_*.txt')
+
+def device_tunnel_log_file(device_id):
+    """Path of the tunnel log for a fleet-onboarded device"""
+    return f'/tmp/tunnel_{device_id}.log'
+
+def device_tunnel_info_file(device_id):
+    """Path of the tunnel info file for a fleet-onboarded device"""
+    return f'/tmp/tunnel_info_{device_id}.txt'
+
+def is_valid_device_id(device_id):
+    """Check that a device ID looks like a UDID (safe to pass to shell commands)"""
+    return isinstance(device_id, str) and bool(UDID_PATTERN.match(device_id))
+
 def list_devices():
     """List connected iOS devices"""
     result = run_pymobiledevice3_command('python3 -m pymobiledevice3 usbmux list')
     return result
 
+def get_attached_device_ids():
+    """Return UDIDs of all attached devices, or None if the device list can't be read"""
+    result = list_devices()
+    if not result['success']:
+        return None
+    try:
+        devices = json.loads(result['output'])
+    except ValueError:
+        return None
+    
+    device_ids = []
+    for device in devices:
+        device_id = device.get('UniqueDeviceID')
+        if device_id and device_id not in device_ids:
+            device_ids.append(device_id)
+    return device_ids
+
 def check_device_passcode(device_id):
     """Check if device passcode is disabled"""
     info_result = run_pymobiledevice3_command(f'python3 -m pymobiledevice3 lockdown info --udid {device_id}')
@@ -39,58 +113,61 @@ def check_device_passcode(device_id):
 
 def check_developer_mode(device_id):
     """Check and enable developer mode if needed"""
-    logger.info("Checking developer mode status...")
+    logger.info(f"Checking developer mode status for device {device_id}...")
     amfi_status = run_pymobiledevice3_command(f'python3 -m pymobiledevice3 amfi developer-mode-status --udid {device_id}')
-    logger.info(f"AMFI status check result: success={amfi_status['success']}, output='{amfi_status['output']}', error='{amfi_status.get('error', '')}'")
+    logger.info(f"AMFI status check result for device {device_id}: success={amfi_status['success']}, output='{amfi_status['output']}', error='{amfi_status.get('error', '')}'")
     
     dev_mode_enabled = False
     
     if amfi_status['success'] and ('enabled' in amfi_status['output'].lower() or 'true' in amfi_status['output'].lower()):
         dev_mode_enabled = True
         dev_mode_result = {'success': True, 'output': 'already enabled'}
-        logger.info("Developer mode is already enabled - skipping enable step")
+        logger.info(f"Developer mode is already enabled on device {device_id} - skipping enable step")
     else:
-        logger.info("Developer mode not enabled - attempting to enable...")
+        logger.info(f"Developer mode not enabled on device {device_id} - attempting to enable...")
         dev_mode_result = run_pymobiledevice3_command(f'python3 -m pymobiledevice3 amfi enable-developer-mode --udid {device_id}')
         if not dev_mode_result['success'] and 'passcode is set' in dev_mode_result['error']:
-            logger.error("Cannot enable developer mode - passcode is set")
+            logger.error(f"Cannot enable developer mode on device {device_id} - passcode is set")
             return None, dev_mode_result
         dev_mode_enabled = dev_mode_result['success']
         if dev_mode_enabled:
-            logger.info("Developer mode enabled successfully")
+            logger.info(f"Developer mode enabled successfully on device {device_id}")
         else:
-            logger.warning(f"Developer mode enable failed: {dev_mode_result.get('error', 'Unknown error')}")
+            logger.warning(f"Developer mode enable failed on device {device_id}: {dev_mode_result.get('error', 'Unknown error')}")
     
     return dev_mode_enabled, dev_mode_result
 
 def mount_developer_disk_image(device_id):
     """Mount DeveloperDiskImage for the device"""
-    logger.info("Checking DeveloperDiskImage mount status...")
+    logger.info(f"Checking DeveloperDiskImage mount status for device {device_id}...")
     mount_result = run_pymobiledevice3_command(f'python3 -m pymobiledevice3 mounter auto-mount --udid {device_id}')
     
     if not mount_result['success'] and 'already mounted' not in mount_result['error']:
-        logger.error(f"Failed to mount DeveloperDiskImage: {mount_result['error']}")
+        logger.error(f"Failed to mount DeveloperDiskImage on device {device_id}: {mount_result['error']}")
         return mount_result
     
     if 'successfully' in mount_result['output']:
-        logger.info("DeveloperDiskImage mounted successfully")
+        logger.info(f"DeveloperDiskImage mounted successfully on device {device_id}")
     else:
-        logger.info("DeveloperDiskImage already mounted")
+        logger.info(f"DeveloperDiskImage already mounted on device {device_id}")
     
     return mount_result
 
-def start_tunnel_service(device_id):
+def start_tunnel_service(device_id, log_file='/tmp/tunnel.log', info_file='/tmp/tunnel_info.txt'):
     """Start tunnel service for iOS 17.4+ and extract connection details"""
-    logger.info("Initiating tunnel service startup...")
-    logger.debug("Tunnel log file: /tmp/tunnel.log")
-    run_pymobiledevice3_command(f'python3 -m pymobiledevice3 lockdown start-tunnel --udid {device_id} > /tmp/tunnel.log 2>&1 &')
-    logger.info("Tunnel service background process started")
+    logger.info(f"Initiating tunnel service startup for device {device_id}...")
+    logger.debug(f"Tunnel log file: {log_file}")
+    run_pymobiledevice3_command(f'python3 -m pymobiledevice3 lockdown start-tunnel --udid {device_id} > {log_file} 2>&1 &')
+    logger.info(f"Tunnel service background process started for device {device_id}")
     
     time.sleep(2)
     
-    # Extract tunnel connection details
-    logger.info("Reading tunnel log to extract connection details...")
-    tunnel_info = run_pymobiledevice3_command('cat /tmp/tunnel.log')
+    return read_tunnel_details(device_id, log_file, info_file)
+
+def read_tunnel_details(device_id, log_file='/tmp/tunnel.log', info_file='/tmp/tunnel_info.txt'):
+    """Extract connection details from a tunnel log and store them for location commands"""
+    logger.info(f"Reading tunnel log for device {device_id} to extract connection details...")
+    tunnel_info = run_pymobiledevice3_command(f'cat {log_file}')
     tunnel_address = None
     tunnel_port = None
     
@@ -108,14 +185,14 @@ def start_tunnel_service(device_id):
     # Store tunnel info for location commands (include device ID)
     if tunnel_address and tunnel_port:
         logger.info(f"Writing tunnel info to file: {tunnel_address} {tunnel_port} {device_id}")
-        run_pymobiledevice3_command(f'echo "{tunnel_address} {tunnel_port} {device_id}" > /tmp/tunnel_info.txt')
+        run_pymobiledevice3_command(f'echo "{tunnel_address} {tunnel_port} {device_id}" > {info_file}')
         tunnel_status = f'established at {tunnel_address}:{tunnel_port}'
-        logger.info(f"Tunnel established successfully: {tunnel_address}:{tunnel_port}")
+        logger.info(f"Tunnel established successfully for device {device_id}: {tunnel_address}:{tunnel_port}")
     else:
         # Still store device ID even if tunnel details aren't ready
-        run_pymobiledevice3_command(f'echo "pending pending {device_id}" > /tmp/tunnel_info.txt')
+        run_pymobiledevice3_command(f'echo "pending pending {device_id}" > {info_file}')
         tunnel_status = 'started (may take a moment to establish)'
-        logger.warning("Tunnel started but connection details not yet available")
+        logger.warning(f"Tunnel started for device {device_id} but connection details not yet available")
     
     return tunnel_status
 
@@ -130,7 +207,7 @@ def connect_device(device_id):
     logger.info(f"Connecting to device: {device_id}")
     
     # Clean up any existing connections first
-    cleanup_existing_connections()
+    cleanup_existing_connections(device_id)
     
     # Check if passcode is disabled
     passcode_protected = check_device_passcode(device_id)
@@ -0,0 +1,282 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.config import (
+    setup_logging,
+    DEFAULT_TUNNEL_TIMEOUT,
+    DEFAULT_ONBOARD_CONCURRENCY,
+    MAX_ONBOARD_CONCURRENCY,
+    ONBOARD_MAX_RETRIES,
+    ONBOARD_RETRY_DELAY,
+    TUNNEL_POLL_INTERVAL,
+)
+from src.device_manager import (
+    cleanup_device_connections,
+    cleanup_all_device_connections,
+    stop_device_tunnel,
+    is_device_tunnel_running,
+    device_tunnel_log_file,
+    device_tunnel_info_file,
+    get_attached_device_ids,
+    is_valid_device_id,
+    check_device_passcode,
+    check_developer_mode,
+    mount_developer_disk_image,
+    start_tunnel_service,
+    read_tunnel_details,
+)
+
+logger = setup_logging()
+
+def validate_device_ids(device_ids):
+    """Validate a non-empty list of UDIDs and return (is_valid, de-duplicated UDIDs or error message)"""
+    if not isinstance(device_ids, list) or not device_ids:
+        return False, 'deviceIds must be "all" or a non-empty list of UDIDs'
+
+    invalid = [device_id for device_id in device_ids if not is_valid_device_id(device_id)]
+    if invalid:
+        return False, 'Invalid UDID(s): ' + ', '.join(str(device_id) for device_id in invalid)
+
+    resolved = []
+    for device_id in device_ids:
+        if device_id not in resolved:
+            resolved.append(device_id)
+    return True, resolved
+
+def resolve_device_ids(device_ids):
+    """Validate a list of attached UDIDs or "all" and return (is_valid, device_ids or error message)"""
+    if device_ids is None:
+        return False, 'deviceIds is required: pass a list of UDIDs or "all"'
+
+    attached = get_attached_device_ids()
+    if attached is None:
+        return False, 'Could not list attached devices'
+
+    if device_ids == 'all':
+        if not attached:
+            return False, 'No devices attached'
+        return True, attached
+
+    is_valid, resolved = validate_device_ids(device_ids)
+    if not is_valid:
+        return False, resolved
+
+    missing = [device_id for device_id in resolved if device_id not in attached]
+    if missing:
+        return False, 'Device(s) not attached: ' + ', '.join(missing)
+
+    return True, resolved
+
+def validate_onboard_options(concurrency, max_retries):
+    """Validate concurrency and retries and return (is_valid, (concurrency, retries) or error message)"""
+    try:
+        concurrency = int(concurrency)
+        max_retries = int(max_retries)
+    except (TypeError, ValueError):
+        return False, 'Concurrency and retries must be integers'
+
+    if not 1 <= concurrency <= MAX_ONBOARD_CONCURRENCY:
+        return False, f'Concurrency must be between 1 and {MAX_ONBOARD_CONCURRENCY}'
+    if max_retries < 0:
+        return False, 'Retries cannot be negative'
+
+    return True, (concurrency, max_retries)
+
+def _step_passcode(device_id):
+    """Prep step: make sure the passcode is disabled"""
+    passcode_protected = check_device_passcode(device_id)
+    if passcode_protected is None:
+        return False, True, 'Could not read device info'
+    if passcode_protected:
+        return False, False, 'Passcode must be disabled (Settings > Face ID & Passcode > Turn Passcode Off)'
+    return True, False, 'passcode disabled'
+
+def _step_developer_mode(device_id):
+    """Prep step: check/enable developer mode"""
+    dev_mode_enabled, dev_mode_result = check_developer_mode(device_id)
+    if dev_mode_enabled is None:
+        return False, False, 'Cannot enable developer mode with passcode set'
+    if not dev_mode_enabled:
+        return False, True, 'Failed to enable developer mode: ' + (dev_mode_result.get('error') or 'Unknown error')
+    if 'already enabled' in dev_mode_result['output']:
+        return True, False, 'already enabled'
+    return True, False, 'enabled'
+
+def _step_disk_image(device_id):
+    """Prep step: mount the DeveloperDiskImage"""
+    mount_result = mount_developer_disk_image(device_id)
+    if not mount_result['success'] and 'already mounted' not in mount_result['error']:
+        return False, True, 'Failed to mount DeveloperDiskImage: ' + mount_result['error']
+    if 'successfully' in mount_result['output']:
+        return True, False, 'mounted successfully'
+    return True, False, 'already mounted'
+
+def _step_tunnel(device_id):
+    """Prep step: start a tunnel with per-device log and info files"""
+    log_file = device_tunnel_log_file(device_id)
+    info_file = device_tunnel_info_file(device_id)
+
+    # A retry keeps a tunnel that is still starting - only a dead one is restarted
+    if is_device_tunnel_running(device_id):
+        logger.info(f"Tunnel still starting for device {device_id} - waiting for connection details")
+        tunnel_status = read_tunnel_details(device_id, log_file, info_file)
+    else:
+        stop_device_tunnel(device_id)
+        tunnel_status = start_tunnel_service(device_id, log_file=log_file, info_file=info_file)
+
+    deadline = time.time() + DEFAULT_TUNNEL_TIMEOUT
+    while not tunnel_status.startswith('established'):
+        if time.time() >= deadline:
+            return False, True, f'Tunnel connection details not available after {DEFAULT_TUNNEL_TIMEOUT}s'
+        time.sleep(TUNNEL_POLL_INTERVAL)
+        if not is_device_tunnel_running(device_id):
+            return False, True, 'Tunnel process exited before connection details were available'
+        tunnel_status = read_tunnel_details(device_id, log_file, info_file)
+    return True, False, tunnel_status
+
+# Prep pipeline, in order: (step name, step function)
+# Each step returns (success, transient, detail) - only transient failures are retried
+ONBOARD_STEPS = [
+    ('passcode', _step_passcode),
+    ('developer_mode', _step_developer_mode),
+    ('disk_image', _step_disk_image),
+    ('tunnel_service', _step_tunnel),
+]
+
+def onboard_device(device_id, max_retries=ONBOARD_MAX_RETRIES, on_event=None):
+    """Run the prep pipeline for one device, retrying transient step failures"""
+    emit = on_event or (lambda event: None)
+    device_start = time.time()
+    details = {}
+    timings = {}
+
+    emit({'type': 'device', 'device_id': device_id, 'status': 'started'})
+
+    # Only this device's tunnel is reset - the single-device connection and other devices are left alone
+    cleanup_device_connections(device_id)
+
+    for step_name, step in ONBOARD_STEPS:
+        step_start = time.time()
+        attempt = 0
+        while True:
+            attempt += 1
+            emit({'type': 'step', 'device_id': device_id, 'step': step_name, 'status': 'started', 'attempt': attempt})
+            try:
+                success, transient, detail = step(device_id)
+            except Exception as e:
+                success, transient, detail = False, True, str(e)
+
+            if success or not transient or attempt > max_retries:
+                break
+
+            delay = ONBOARD_RETRY_DELAY * attempt
+            logger.warning(f"[{device_id}] Step {step_name} failed (attempt {attempt}): {detail} - retrying in {delay}s")
+            emit({'type': 'step', 'device_id': device_id, 'step': step_name, 'status': 'retrying', 'attempt': attempt, 'message': detail})
+            time.sleep(delay)
+
+        timings[step_name] = round(time.time() - step_start, 2)
+
+        if not success:
+            logger.error(f"[{device_id}] Step {step_name} failed: {detail}")
+            emit({'type': 'step', 'device_id': device_id, 'step': step_name, 'status': 'failed', 'attempt': attempt, 'message': detail, 'duration': timings[step_name]})
+            result = {
+                'device_id': device_id,
+                'success': False,
+                'message': detail,
+                'failed_step': step_name,
+                'details': details,
+                'timings': timings,
+                'duration': round(time.time() - device_start, 2)
+            }
+            emit(dict(result, type='device', status='failed'))
+            return result
+
+        details[step_name] = detail
+        emit({'type': 'step', 'device_id': device_id, 'step': step_name, 'status': 'completed', 'attempt': attempt, 'message': detail, 'duration': timings[step_name]})
+
+    logger.info(f"[{device_id}] Device prepared for location testing")
+    result = {
+        'device_id': device_id,
+        'success': True,
+        'message': 'Device prepared for location testing',
+        'details': details,
+        'timings': timings,
+        'duration': round(time.time() - device_start, 2)
+    }
+    emit(dict(result, type='device', status='completed'))
+    return result
+
+def onboard_devices(device_ids, concurrency=DEFAULT_ONBOARD_CONCURRENCY, max_retries=ONBOARD_MAX_RETRIES, on_event=None):
+    """Prepare several devices in parallel, at most `concurrency` at a time"""
+    emit = on_event or (lambda event: None)
+    start = time.time()
+    concurrency = max(1, min(concurrency, MAX_ONBOARD_CONCURRENCY))
+
+    logger.info(f"Onboarding {len(device_ids)} device(s) with concurrency {concurrency}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(onboard_device, device_id, max_retries, emit) for device_id in device_ids]
+        results = [future.result() for future in futures]
+
+    succeeded = [r['device_id'] for r in results if r['success']]
+    failed = [r['device_id'] for r in results if not r['success']]
+    summary = {
+        'success': not failed,
+        'message': f'{len(succeeded)} of {len(results)} device(s) prepared for location testing',
+        'succeeded': succeeded,
+        'failed': failed,
+        'results': results,
+        'duration': round(time.time() - start, 2),
+        'slowest_device': max((r['duration'] for r in results), default=0),
+        'sequential_estimate': round(sum(r['duration'] for r in results), 2)
+    }
+    logger.info(f"Onboarding finished in {summary['duration']}s: {summary['message']}")
+    emit(dict(summary, type='summary'))
+    return summary
+
+def teardown_devices(device_ids):
+    """Stop the tunnels and remove the tunnel files of onboarded devices ("all" or a list of UDIDs)"""
+    if device_ids == 'all':
+        cleanup_all_device_connections()
+        return {
+            'success': True,
+            'message': 'Tunnels stopped for all devices'
+        }
+
+    is_valid, resolved = validate_device_ids(device_ids)
+    if not is_valid:
+        return {
+            'success': False,
+            'message': resolved
+        }
+
+    for device_id in resolved:
+        cleanup_device_connections(device_id)
+    return {
+        'success': True,
+        'message': f'Tunnels stopped for {len(resolved)} device(s)'
+    }
+
+def stream_onboarding(device_ids, concurrency=DEFAULT_ONBOARD_CONCURRENCY, max_retries=ONBOARD_MAX_RETRIES):
+    """Run onboarding in the background and yield progress events as NDJSON lines"""
+    events = queue.Queue()
+    done = object()
+
+    def run():
+        try:
+            onboard_devices(device_ids, concurrency, max_retries, on_event=events.put)
+        except Exception as e:
+            logger.error(f"Onboarding error: {e}")
+            events.put({'type': 'error', 'success': False, 'message': str(e)})
+        finally:
+            events.put(done)
+
+    threading.Thread(target=run, daemon=True).start()
+
+    while True:
+        event = events.get()
+        if event is done:
+            break
+        yield json.dumps(event) + '\n'
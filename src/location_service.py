@@ -1,5 +1,6 @@
 from src.process_utils import run_pymobiledevice3_command
 from src.config import setup_logging
+from src.device_manager import device_tunnel_info_file
 
 logger = setup_logging()
 
@@ -19,10 +20,11 @@ def validate_coordinates(lat, lng):
     except ValueError:
         return False, 'Invalid coordinate format'
 
-def get_tunnel_info():
-    """Read tunnel info from file"""
-    logger.debug("Reading tunnel info from /tmp/tunnel_info.txt")
-    tunnel_info = run_pymobiledevice3_command('cat /tmp/tunnel_info.txt')
+def get_tunnel_info(device_id=None):
+    """Read tunnel info from file - a fleet-onboarded device's file if device_id is given"""
+    info_file = device_tunnel_info_file(device_id) if device_id else '/tmp/tunnel_info.txt'
+    logger.debug(f"Reading tunnel info from {info_file}")
+    tunnel_info = run_pymobiledevice3_command(f'cat {info_file}')
     
     if not tunnel_info['success'] or not tunnel_info['output'].strip():
         return None, None, None
@@ -80,7 +82,7 @@ def set_location_fallback(device_id, lat, lng):
     
     return result
 
-def set_location(lat, lng):
+def set_location(lat, lng, device_id=None):
     """Main location setting function with all fallback logic"""
     # Validate coordinates
     is_valid, validation_result = validate_coordinates(lat, lng)
@@ -93,7 +95,7 @@ def set_location(lat, lng):
     lat_float, lng_float = validation_result
     
     # Get tunnel info
-    tunnel_address, tunnel_port, device_id = get_tunnel_info()
+    tunnel_address, tunnel_port, device_id = get_tunnel_info(device_id)
     
     if not device_id:
         return {
@@ -163,12 +165,12 @@ def clear_location_fallback(device_id):
     
     return result
 
-def clear_location():
+def clear_location(device_id=None):
     """Main location clearing function with all fallback logic"""
     logger.info("Attempting to clear location simulation...")
     
     # Get tunnel info
-    tunnel_address, tunnel_port, device_id = get_tunnel_info()
+    tunnel_address, tunnel_port, device_id = get_tunnel_info(device_id)
     
     if not device_id:
         return {
@@ -13,7 +13,7 @@ def run_pymobiledevice3_command(command, timeout=30):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
-            preexec_fn=os.setsid if hasattr(os, 'setsid') else None
+            start_new_session=hasattr(os, 'setsid')
         )
         
         # Tunnel commands need special handling - they don't exit automatically
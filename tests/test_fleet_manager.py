@@ -0,0 +1,178 @@
+import pytest
+from src import fleet_manager
+
+UDID = '00008030-001A2D8E3A08802E'
+OTHER_UDID = 'a' * 40
+
+
+@pytest.fixture(autouse=True)
+def fake_device(monkeypatch):
+    """Stub out every device command so the prep pipeline runs instantly"""
+    monkeypatch.setattr(fleet_manager, 'ONBOARD_RETRY_DELAY', 0)
+    monkeypatch.setattr(fleet_manager, 'TUNNEL_POLL_INTERVAL', 0)
+    monkeypatch.setattr(fleet_manager, 'get_attached_device_ids', lambda: [UDID, OTHER_UDID])
+    monkeypatch.setattr(fleet_manager, 'cleanup_device_connections', lambda device_id: None)
+    monkeypatch.setattr(fleet_manager, 'stop_device_tunnel', lambda device_id: None)
+    monkeypatch.setattr(fleet_manager, 'check_device_passcode', lambda device_id: False)
+    monkeypatch.setattr(fleet_manager, 'check_developer_mode', lambda device_id: (True, {'success': True, 'output': 'already enabled'}))
+    monkeypatch.setattr(fleet_manager, 'mount_developer_disk_image', lambda device_id: {'success': True, 'output': 'mounted successfully', 'error': ''})
+    monkeypatch.setattr(fleet_manager, 'is_device_tunnel_running', lambda device_id: True)
+    monkeypatch.setattr(fleet_manager, 'start_tunnel_service', lambda device_id, log_file, info_file: 'established at fd00::1:1234')
+    monkeypatch.setattr(fleet_manager, 'read_tunnel_details', lambda device_id, log_file, info_file: 'established at fd00::1:1234')
+
+
+def test_transient_failure_is_retried_until_success(monkeypatch):
+    calls = []
+
+    def mount(device_id):
+        calls.append(device_id)
+        if len(calls) < 3:
+            return {'success': False, 'output': '', 'error': 'usbmuxd busy'}
+        return {'success': True, 'output': 'mounted successfully', 'error': ''}
+
+    monkeypatch.setattr(fleet_manager, 'mount_developer_disk_image', mount)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=2)
+
+    assert result['success']
+    assert len(calls) == 3
+
+
+def test_transient_failure_stops_at_retry_cap(monkeypatch):
+    calls = []
+
+    def mount(device_id):
+        calls.append(device_id)
+        return {'success': False, 'output': '', 'error': 'usbmuxd busy'}
+
+    monkeypatch.setattr(fleet_manager, 'mount_developer_disk_image', mount)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=2)
+
+    assert not result['success']
+    assert result['failed_step'] == 'disk_image'
+    assert len(calls) == 3
+
+
+def test_developer_mode_enable_failure_is_retried(monkeypatch):
+    calls = []
+
+    def developer_mode(device_id):
+        calls.append(device_id)
+        return False, {'success': False, 'output': '', 'error': 'boom'}
+
+    monkeypatch.setattr(fleet_manager, 'check_developer_mode', developer_mode)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=1)
+
+    assert not result['success']
+    assert result['failed_step'] == 'developer_mode'
+    assert len(calls) == 2
+
+
+def test_passcode_set_is_not_retried(monkeypatch):
+    calls = []
+
+    def passcode(device_id):
+        calls.append(device_id)
+        return True
+
+    monkeypatch.setattr(fleet_manager, 'check_device_passcode', passcode)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=2)
+
+    assert not result['success']
+    assert result['failed_step'] == 'passcode'
+    assert len(calls) == 1
+
+
+def test_slow_tunnel_is_polled_not_restarted(monkeypatch):
+    starts = []
+    reads = []
+
+    def start(device_id, log_file, info_file):
+        starts.append(device_id)
+        return 'started (may take a moment to establish)'
+
+    def read(device_id, log_file, info_file):
+        reads.append(device_id)
+        if len(reads) < 3:
+            return 'started (may take a moment to establish)'
+        return 'established at fd00::1:1234'
+
+    monkeypatch.setattr(fleet_manager, 'is_device_tunnel_running', lambda device_id: bool(starts))
+    monkeypatch.setattr(fleet_manager, 'start_tunnel_service', start)
+    monkeypatch.setattr(fleet_manager, 'read_tunnel_details', read)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=0)
+
+    assert result['success']
+    assert result['details']['tunnel_service'] == 'established at fd00::1:1234'
+    assert len(starts) == 1
+
+
+def test_dead_tunnel_is_restarted_on_retry(monkeypatch):
+    starts = []
+
+    def start(device_id, log_file, info_file):
+        starts.append(device_id)
+        if len(starts) == 1:
+            return 'started (may take a moment to establish)'
+        return 'established at fd00::1:1234'
+
+    monkeypatch.setattr(fleet_manager, 'is_device_tunnel_running', lambda device_id: False)
+    monkeypatch.setattr(fleet_manager, 'start_tunnel_service', start)
+
+    result = fleet_manager.onboard_device(UDID, max_retries=1)
+
+    assert result['success']
+    assert len(starts) == 2
+
+
+def test_onboard_devices_reports_each_device():
+    summary = fleet_manager.onboard_devices([UDID, OTHER_UDID], concurrency=2)
+
+    assert summary['success']
+    assert summary['succeeded'] == [UDID, OTHER_UDID]
+    assert summary['failed'] == []
+
+
+def test_resolve_device_ids_requires_device_ids():
+    assert fleet_manager.resolve_device_ids(None)[0] is False
+
+
+def test_resolve_device_ids_all():
+    assert fleet_manager.resolve_device_ids('all') == (True, [UDID, OTHER_UDID])
+
+
+@pytest.mark.parametrize('device_ids', [5, 'abc', [], [{}], ['x; rm -rf /'], [UDID[:-1]]])
+def test_resolve_device_ids_rejects_malformed(device_ids):
+    is_valid, message = fleet_manager.resolve_device_ids(device_ids)
+
+    assert not is_valid
+    assert isinstance(message, str)
+
+
+def test_resolve_device_ids_rejects_unattached():
+    is_valid, message = fleet_manager.resolve_device_ids([UDID, 'b' * 40])
+
+    assert not is_valid
+    assert 'b' * 40 in message
+
+
+def test_resolve_device_ids_removes_duplicates():
+    assert fleet_manager.resolve_device_ids([UDID, UDID]) == (True, [UDID])
+
+
+@pytest.mark.parametrize('concurrency', [0, -1, fleet_manager.MAX_ONBOARD_CONCURRENCY + 1, 'many'])
+def test_validate_onboard_options_rejects_bad_concurrency(concurrency):
+    assert fleet_manager.validate_onboard_options(concurrency, 2)[0] is False
+
+
+@pytest.mark.parametrize('concurrency', [1, fleet_manager.MAX_ONBOARD_CONCURRENCY])
+def test_validate_onboard_options_accepts_bounds(concurrency):
+    assert fleet_manager.validate_onboard_options(concurrency, 2) == (True, (concurrency, 2))
+
+
+def test_validate_onboard_options_rejects_negative_retries():
+    assert fleet_manager.validate_onboard_options(4, -1)[0] is False